@@ -1,23 +1,73 @@
 import pandas as pd
 import streamlit as st
 from pathlib import Path
-import pyperclip
+import hashlib
 import io
+import sys
+from functools import lru_cache
 
+HIERARCHY_STYLES = [
+    'color:#ffffff; font-size:22px; font-weight:bold;',   # Level 0
+    'color:#ffd700; font-size:20px; font-weight:bold;',   # Level 1
+    'color:#00ffcc; font-size:18px;',                     # Level 2
+    'color:#ff69b4; font-size:16px;',                     # Level 3
+    'color:#87ceeb; font-size:15px;',                     # Level 4
+    'color:#cccccc; font-size:14px;',                     # Level 5+
+]
+
+EXPANDER_STYLES = [
+    'color:#ffffff; font-size:20px; font-weight:bold;',   # Level 0 (Parent)
+    'color:#ffd700; font-size:18px; font-weight:bold;',   # Level 1 (Master)
+    'color:#00ffcc; font-size:16px;',                     # Level 2 (Sub1)
+    'color:#ff69b4; font-size:15px;',                     # Level 3 (Sub2)
+]
+
+# Opening markup depends only on the level, so build it once instead of per node
+_STYLED_PREFIXES = ['<div style="' + style + '">' for style in HIERARCHY_STYLES]
+
+@lru_cache(maxsize=None)
+def _expander_prefix(level):
+    """
+    Opening div and indent for an expander row at the given level.
+    """
+    style = EXPANDER_STYLES[min(level, len(EXPANDER_STYLES) - 1)]
+    return '<div style="' + style + '">' + '&nbsp;' * 4 * level
+
+_EXPANDER_PREFIXES = [_expander_prefix(level) for level in range(len(EXPANDER_STYLES))]
+
+def _hash_df(df):
+    """
+    Hash a DataFrame's full contents for st.cache_data, instead of Streamlit's sampled hash.
+    """
+    return tuple(df.columns), int(pd.util.hash_pandas_object(df, index=True).sum())
+
+_cache_by_df = st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _hash_df})
+
+@_cache_by_df
 def build_hierarchy(df):
     """
     Build a hierarchical dictionary from the DataFrame
     """
     hierarchy = {}
     
-    for _, row in df.iterrows():
+    # Normalize every cell in pandas first: strip, and treat blanks as missing
+    normalized = df.astype('string').apply(lambda s: s.str.strip())
+    normalized = normalized.mask(normalized.isin(['']))
+    
+    # Collapse duplicate paths so the Python walk only runs over unique rows
+    normalized = normalized.dropna(how='all').drop_duplicates()
+    
+    # Missing cells become None so the inner loop is just an identity check and a dict lookup;
+    # plain nested lists skip the NumPy row view and per-cell array indexing
+    rows = normalized.to_numpy(dtype=object, na_value=None).tolist()
+    
+    for row in rows:
         current = hierarchy
-        for col in df.columns:
-            value = str(row[col]).strip()
-            if value and value.lower() != 'nan':
-                if value not in current:
-                    current[value] = {}
-                current = current[value]
+        for value in row:
+            if value is None:
+                continue
+            # Interning shares one string object per category label across the whole tree
+            current = current.setdefault(sys.intern(value), {})
     
     return hierarchy
 
@@ -25,79 +75,93 @@ def format_hierarchy_styled(hierarchy, level=0):
     """
     Format the hierarchy into a readable string with different colors/sizes for each level.
     """
-    styles = [
-        'color:#ffffff; font-size:22px; font-weight:bold;',   # Level 0
-        'color:#ffd700; font-size:20px; font-weight:bold;',   # Level 1
-        'color:#00ffcc; font-size:18px;',                     # Level 2
-        'color:#ff69b4; font-size:16px;',                     # Level 3
-        'color:#87ceeb; font-size:15px;',                     # Level 4
-        'color:#cccccc; font-size:14px;',                     # Level 5+
-    ]
-    
+    last = len(_STYLED_PREFIXES) - 1
     result = []
-    for key, value in hierarchy.items():
-        style = styles[level] if level < len(styles) else styles[-1]
-        result.append(f'<div style="{style}">{key}</div>')
+    
+    # Walk depth-first with an explicit stack of (children iterator, level) instead of recursing
+    stack = [(iter(hierarchy.items()), level)]
+    while stack:
+        items, depth = stack[-1]
+        node = next(items, None)
+        if node is None:
+            stack.pop()
+            continue
+        key, value = node
+        result.append(_STYLED_PREFIXES[min(depth, last)] + key + '</div>')
         if value:
-            result.extend(format_hierarchy_styled(value, level + 1))
+            stack.append((iter(value.items()), depth + 1))
+    
     return result
 
+def _pair_lines(df, parent_col, child_col):
+    """
+    Build indented parent/child text for two columns using one groupby pass over the data.
+    """
+    pairs = df[[parent_col, child_col]].dropna(subset=[parent_col]).drop_duplicates()
+    children = pairs[pairs[child_col].notna() & (pairs[child_col] != '')]
+    
+    # Sort all children once via their categorical codes; groupby keeps that order per parent
+    order = pd.Categorical(children[child_col]).codes.argsort(kind='stable')
+    grouped = children.iloc[order].groupby(parent_col, sort=False)[child_col].agg(list)
+    
+    lines = []
+    for parent in pairs[parent_col].unique():
+        lines.append(parent)
+        for child in grouped.get(parent, []):
+            lines.append('    ' + child)  # 4 spaces indentation
+        lines.append('')  # Add blank line between groups
+    return '\n'.join(lines).strip()
+
+@_cache_by_df
 def show_parent_master_only(df):
     """
     Show only unique Parent/Master category pairs with indentation format, grouped by parent.
     """
     if 'PARENT CATEGORY' in df.columns and 'MASTER CATEGORY' in df.columns:
-        lines = []
-        # Group by Parent Category
-        for parent in df['PARENT CATEGORY'].unique():
-            if pd.isna(parent):
-                continue
-            lines.append(parent)
-            # Get all master categories for this parent
-            masters = df[df['PARENT CATEGORY'] == parent]['MASTER CATEGORY'].unique()
-            for master in sorted(masters):
-                if pd.isna(master):
-                    continue
-                lines.append('    ' + master)  # 4 spaces indentation
-            lines.append('')  # Add blank line between parents
-        return '\n'.join(lines).strip()
+        return _pair_lines(df, 'PARENT CATEGORY', 'MASTER CATEGORY')
     else:
         return 'Columns not found!'
 
+@_cache_by_df
 def show_master_sub1_pairs(df):
     """
     Show Master/Subcategory 1 pairs with indentation format, grouped by master.
     """
     if 'MASTER CATEGORY' in df.columns and 'SUBCATEGORY 1' in df.columns:
-        lines = []
-        # Group by Master Category
-        for master in df['MASTER CATEGORY'].unique():
-            if pd.isna(master):
-                continue
-            lines.append(master)
-            # Get all subcategory 1 items for this master
-            sub1s = df[
-                (df['MASTER CATEGORY'] == master) & 
-                (df['SUBCATEGORY 1'].notna()) & 
-                (df['SUBCATEGORY 1'] != '')
-            ]['SUBCATEGORY 1'].unique()
-            for sub1 in sorted(sub1s):
-                lines.append('    ' + sub1)  # 4 spaces indentation
-            lines.append('')  # Add blank line between masters
-        return '\n'.join(lines).strip()
+        return _pair_lines(df, 'MASTER CATEGORY', 'SUBCATEGORY 1')
     else:
         return 'Columns not found!'
 
+@st.cache_data(show_spinner=False)
+def _load_df(file_bytes, name):
+    """
+    Parse the raw file contents into a DataFrame, cached on the bytes so reruns skip the parse
+    """
+    if name.endswith('.csv'):
+        return pd.read_csv(
+            io.BytesIO(file_bytes),
+            dtype=str,
+            keep_default_na=False,
+            na_values=[''],
+        )
+    return pd.read_excel(
+        io.BytesIO(file_bytes),
+        engine='openpyxl',
+        dtype=str,
+        keep_default_na=False,
+        na_values=[''],
+    )
+
 def process_file(uploaded_file):
     """
     Process the uploaded file and return the DataFrame
     """
     try:
         if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
+            df = _load_df(uploaded_file.getvalue(), uploaded_file.name)
             st.write("Successfully read CSV file")
         elif uploaded_file.name.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(uploaded_file, engine='openpyxl')
+            df = _load_df(uploaded_file.getvalue(), uploaded_file.name)
             st.write("Successfully read Excel file")
         else:
             st.error(f"Unsupported file type: {uploaded_file.name}")
@@ -113,101 +177,95 @@ def format_hierarchy_for_expander(items, level=0):
     """
     Format items for display inside an expander with proper styling and indentation.
     """
-    styles = [
-        'color:#ffffff; font-size:20px; font-weight:bold;',   # Level 0 (Parent)
-        'color:#ffd700; font-size:18px; font-weight:bold;',   # Level 1 (Master)
-        'color:#00ffcc; font-size:16px;',                     # Level 2 (Sub1)
-        'color:#ff69b4; font-size:15px;',                     # Level 3 (Sub2)
-    ]
-    
-    result = []
-    indent = '&nbsp;' * 4 * level
-    style = styles[level] if level < len(styles) else styles[-1]
-    
-    for item in items:
-        result.append(f'<div style="{style}">{indent}{item}</div>')
-    
-    return result
+    prefix = _expander_prefix(level)
+    return [prefix + item + '</div>' for item in items]
 
+@_cache_by_df
 def get_hierarchy_by_parent(df):
     """
     Organize the hierarchy by parent category with all subcategories.
     """
+    columns = ['PARENT CATEGORY', 'MASTER CATEGORY', 'SUBCATEGORY 1']
+    has_sub2 = 'SUBCATEGORY 2' in df.columns
+    if has_sub2:
+        columns.append('SUBCATEGORY 2')
+    
+    # One dedup pass yields every unique path in first-seen order; no per-parent masking
+    paths = df[columns].dropna(subset=['PARENT CATEGORY']).drop_duplicates()
+    
     hierarchies = {}
+    masters = {}
+    sub1s = {}
     
-    for parent in df['PARENT CATEGORY'].unique():
-        if pd.isna(parent):
+    for path in paths.itertuples(index=False, name=None):
+        parent, master, sub1 = path[:3]
+        
+        hierarchy = hierarchies.get(parent)
+        if hierarchy is None:
+            hierarchy = hierarchies[parent] = {
+                'parent': parent,
+                'masters': []
+            }
+        
+        if pd.isna(master):
             continue
-            
-        parent_data = df[df['PARENT CATEGORY'] == parent]
-        hierarchy = {
-            'parent': parent,
-            'masters': []
-        }
         
-        for master in parent_data['MASTER CATEGORY'].unique():
-            if pd.isna(master):
-                continue
-                
-            master_data = parent_data[parent_data['MASTER CATEGORY'] == master]
-            master_dict = {
+        master_dict = masters.get((parent, master))
+        if master_dict is None:
+            master_dict = masters[(parent, master)] = {
                 'name': master,
                 'sub1': []
             }
-            
-            # Get Subcategory 1 items
-            sub1_data = master_data['SUBCATEGORY 1'].dropna().unique()
-            for sub1 in sub1_data:
-                if pd.isna(sub1) or sub1 == '':
-                    continue
-                    
-                sub1_dict = {
-                    'name': sub1,
-                    'sub2': []
-                }
-                
-                # Get Subcategory 2 items if they exist
-                if 'SUBCATEGORY 2' in master_data.columns:
-                    sub2_data = master_data[
-                        (master_data['SUBCATEGORY 1'] == sub1) & 
-                        (master_data['SUBCATEGORY 2'].notna()) & 
-                        (master_data['SUBCATEGORY 2'] != '')
-                    ]['SUBCATEGORY 2'].unique()
-                    
-                    sub1_dict['sub2'] = list(sub2_data)
-                
-                master_dict['sub1'].append(sub1_dict)
-            
             hierarchy['masters'].append(master_dict)
         
-        hierarchies[parent] = hierarchy
+        if pd.isna(sub1) or sub1 == '':
+            continue
+        
+        sub1_dict = sub1s.get((parent, master, sub1))
+        if sub1_dict is None:
+            sub1_dict = sub1s[(parent, master, sub1)] = {
+                'name': sub1,
+                'sub2': []
+            }
+            master_dict['sub1'].append(sub1_dict)
+        
+        # Paths are unique, so each Subcategory 2 shows up at most once per Subcategory 1
+        if has_sub2:
+            sub2 = path[3]
+            if not pd.isna(sub2) and sub2 != '':
+                sub1_dict['sub2'].append(sub2)
     
     return hierarchies
 
-def display_hierarchy_by_parent(df):
+def display_hierarchy_by_parent(df, hierarchies=None):
     """
     Display the hierarchy using expandable sections by parent category.
     """
-    hierarchies = get_hierarchy_by_parent(df)
+    if hierarchies is None:
+        hierarchies = get_hierarchy_by_parent(df)
     
     for parent, hierarchy in hierarchies.items():
         with st.expander(parent, expanded=False):
+            # Collect the whole expander body and send it as a single markdown element
+            parts = []
+            
             # Display masters under this parent
             for master in hierarchy['masters']:
                 # Display master category
-                master_html = format_hierarchy_for_expander([master['name']], level=1)
-                st.markdown('<br>'.join(master_html), unsafe_allow_html=True)
+                parts.append(_EXPANDER_PREFIXES[1] + master['name'] + '</div>')
                 
                 # Display subcategories
                 for sub1 in master['sub1']:
                     # Display Subcategory 1
-                    sub1_html = format_hierarchy_for_expander([sub1['name']], level=2)
-                    st.markdown('<br>'.join(sub1_html), unsafe_allow_html=True)
+                    parts.append(_EXPANDER_PREFIXES[2] + sub1['name'] + '</div>')
                     
                     # Display Subcategory 2 if it exists
                     if sub1['sub2']:
                         sub2_html = format_hierarchy_for_expander(sub1['sub2'], level=3)
-                        st.markdown('<br>'.join(sub2_html), unsafe_allow_html=True)
+                        parts.append('<br>'.join(sub2_html))
+            
+            if parts:
+                st.markdown('\n'.join(parts), unsafe_allow_html=True)
 
 def main():
     st.title("Category Hierarchy Generator")
@@ -219,9 +277,17 @@ def main():
             df = process_file(uploaded_file)
             
             if df is not None:
+                # Derive every view once per uploaded file; widget reruns reuse them
+                file_key = hashlib.md5(uploaded_file.getvalue()).hexdigest()
+                if st.session_state.get('file_key') != file_key:
+                    st.session_state['hierarchies'] = get_hierarchy_by_parent(df)
+                    st.session_state['parent_master'] = show_parent_master_only(df)
+                    st.session_state['master_sub1'] = show_master_sub1_pairs(df)
+                    st.session_state['file_key'] = file_key
+                
                 # 1. Colored Expandable Hierarchy View
                 st.subheader("Category Hierarchy")
-                display_hierarchy_by_parent(df)
+                display_hierarchy_by_parent(df, st.session_state['hierarchies'])
                 
                 # Create two columns for the text sections
                 col1, col2 = st.columns(2)
@@ -229,20 +295,27 @@ def main():
                 # 2. Parent/Master Text Copy in first column
                 with col1:
                     st.subheader("Parent/Master Categories")
-                    parent_master = show_parent_master_only(df)
-                    st.text_area("Parent/Master Categories", parent_master, height=400)
-                    if st.button("Copy Parent/Master"):
-                        pyperclip.copy(parent_master)
-                        st.success("Parent/Master copied to clipboard!")
+                    parent_master = st.session_state['parent_master']
+                    # st.code ships a client-side copy button, so nothing runs on the server
+                    st.code(parent_master, language=None)
+                    st.download_button(
+                        "Download Parent/Master",
+                        data=parent_master.encode('utf-8'),
+                        file_name="parent_master.txt",
+                        mime="text/plain",
+                    )
                 
                 # 3. Master/Sub1 Text Copy in second column
                 with col2:
                     st.subheader("Master/Subcategory 1 Pairs")
-                    master_sub1 = show_master_sub1_pairs(df)
-                    st.text_area("Master/Subcategory 1 Pairs", master_sub1, height=400)
-                    if st.button("Copy Master/Sub1"):
-                        pyperclip.copy(master_sub1)
-                        st.success("Master/Sub1 copied to clipboard!")
+                    master_sub1 = st.session_state['master_sub1']
+                    st.code(master_sub1, language=None)
+                    st.download_button(
+                        "Download Master/Sub1",
+                        data=master_sub1.encode('utf-8'),
+                        file_name="master_sub1.txt",
+                        mime="text/plain",
+                    )
                 
         except Exception as e:
             st.error(f"Error processing file: {str(e)}")